@@ -1,18 +1,90 @@
 import argparse
 import logging
 import os
+import sqlite3
 import sys
+import threading
 import warnings
-from multiprocessing import Pool, cpu_count
+from importlib.util import find_spec
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 
 import cv2
+import numpy as np
+import torch
 from PIL import Image
 from tqdm import tqdm
-from ultralytics import YOLO
+
+# Keep PIL's own opener for header reads: importing ultralytics replaces
+# Image.open with one that pip-installs pi-heif whenever a file fails to open
+_PIL_OPEN = Image.open
+
+from ultralytics import YOLO  # noqa: E402
+from ultralytics.utils.downloads import attempt_download_asset  # noqa: E402
+
+try:
+    # Optional: libjpeg-turbo decodes JPEGs straight to a scaled-down grayscale
+    from turbojpeg import TJPF_GRAY, TurboJPEG
+except ImportError:
+    TurboJPEG = None
 
 # Suppress ultralytics warnings for cleaner output
 warnings.filterwarnings("ignore", category=UserWarning, module="ultralytics")
 
+# Per-thread detector state; OpenCV detectors are not safe to share across threads
+_THREAD_STATE = threading.local()
+
+# YuNet CNN face detector, used instead of the Haar cascade when present
+FACE_MODEL_NAME = "face_detection_yunet_2023mar.onnx"
+
+# Let Haar detection run through OpenCL (via UMat) on GPU-capable hosts
+if cv2.ocl.haveOpenCL():
+    cv2.ocl.setUseOpenCL(True)
+
+# File extensions picked up by process_directory
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+
+# Largest number of paths handed to a pool thread at once
+IMAP_CHUNKSIZE = 32
+
+# Candidate orientations, tried in order: (angle, cv2 rotate code)
+ROTATIONS = [
+    (0, None),
+    (90, cv2.ROTATE_90_CLOCKWISE),
+    (180, cv2.ROTATE_180),
+    (270, cv2.ROTATE_90_COUNTERCLOCKWISE),
+]
+
+# EXIF orientation tag and the values that are plain rotations: value -> angle
+EXIF_ORIENTATION_TAG = 274
+EXIF_ORIENTATION_ANGLES = {3: 180, 6: 90, 8: 270}
+
+# The frontal-face cascade rarely separates 0° from 180°, so the face pass
+# skips 180° and leaves upside-down images to object detection
+FACE_ROTATIONS = [rotation for rotation in ROTATIONS if rotation[0] != 180]
+
+# Longest side images are downscaled to before face detection
+FACE_DETECTION_MAX_DIM = 640
+
+# Blank pixels between tiled rotations; wider than the 24px minimum face size
+FACE_TILE_GAP = 32
+
+# YOLO model shared by all threads, loaded on first use by get_yolo_model
+_YOLO_MODEL = None
+_YOLO_LOAD_FAILED = False
+_YOLO_LOCK = threading.Lock()
+
+# Results cache shared by all threads, opened by process_directory
+CACHE_FILENAME = ".rotate_cache.sqlite"
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+# Number of rotated images sent to YOLO in a single forward pass
+YOLO_BATCH_SIZE = 16
+
+# YOLO inference size; a yes/no "anything detected" signal needs little detail
+YOLO_IMGSZ = 320
+
 
 def get_model_path():
     """Get the path to the YOLO model, handling PyInstaller bundled resources"""
@@ -27,14 +99,253 @@ def get_model_path():
     return "yolo11n.pt"
 
 
-def detect_faces(image):
-    """Return True if faces detected, else False"""
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    face_cascade = cv2.CascadeClassifier(
-        cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+def _onnxruntime_matches_device():
+    """Check that ONNX Runtime can run on the device PyTorch would use"""
+    if not find_spec("onnxruntime"):
+        return False
+    if not torch.cuda.is_available():
+        return True
+    # Without the CUDA provider, ultralytics pip-installs onnxruntime-gpu on
+    # load, or falls back to running the model on the CPU
+    import onnxruntime
+
+    return "CUDAExecutionProvider" in onnxruntime.get_available_providers()
+
+
+def get_exported_model_path(model_path):
+    """
+    Return an accelerated export of the YOLO model, exporting it on first run.
+
+    Uses a TensorRT FP16 engine when CUDA and TensorRT are available, an ONNX
+    model when ONNX Runtime is installed for the same device, and the original
+    weights otherwise.
+
+    Args:
+        model_path: Path to the PyTorch .pt weights
+
+    Returns:
+        str: Path of the model file to load
+    """
+    if getattr(sys, "frozen", False):
+        # The bundle is unpacked to a fresh temp dir, so an export wouldn't persist
+        return model_path
+
+    if not find_spec("onnx"):
+        return model_path
+    if torch.cuda.is_available() and find_spec("tensorrt"):
+        export_format, suffix, half = "engine", ".engine", True
+    elif _onnxruntime_matches_device():
+        export_format, suffix, half = "onnx", ".onnx", False
+    else:
+        return model_path
+
+    try:
+        # Bare names like "yolo11n.pt" may live in ultralytics' weights dir, and
+        # the exporter writes next to wherever the weights really are
+        weights_path = attempt_download_asset(model_path)
+    except Exception as e:
+        logging.debug(f"Failed to locate YOLO weights {model_path}: {e}")
+        return model_path
+
+    exported_path = os.path.splitext(weights_path)[0] + suffix
+    if os.path.exists(exported_path):
+        return exported_path
+
+    try:
+        # Simplifying makes ultralytics auto-install onnxslim (and
+        # onnxruntime-gpu on CUDA), so stick to what find_spec found
+        return YOLO(weights_path).export(
+            format=export_format,
+            imgsz=YOLO_IMGSZ,
+            half=half,
+            dynamic=True,
+            batch=YOLO_BATCH_SIZE,
+            simplify=False,
+        )
+    except Exception as e:
+        logging.debug(f"Failed to export YOLO model to {export_format}: {e}")
+        return model_path
+
+
+def get_face_model_path():
+    """Get the path to the YuNet face model, or None if it isn't available"""
+    if getattr(sys, "frozen", False):
+        # Running as PyInstaller bundle
+        model_path = os.path.join(sys._MEIPASS, FACE_MODEL_NAME)
+    else:
+        model_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), FACE_MODEL_NAME
+        )
+    return model_path if os.path.exists(model_path) else None
+
+
+def get_face_detector():
+    """Return this thread's YuNet face detector, or None to fall back to Haar"""
+    if not hasattr(_THREAD_STATE, "face_detector"):
+        face_detector = None
+        model_path = get_face_model_path()
+        if model_path is not None and hasattr(cv2, "FaceDetectorYN"):
+            try:
+                face_detector = cv2.FaceDetectorYN.create(
+                    model_path, "", (320, 320), 0.6, 0.3, 5000
+                )
+            except cv2.error as e:
+                logging.debug(f"Failed to load YuNet face model: {e}")
+        _THREAD_STATE.face_detector = face_detector
+    return _THREAD_STATE.face_detector
+
+
+def get_face_cascade():
+    """Return this thread's Haar cascade, loading the XML on first use"""
+    face_cascade = getattr(_THREAD_STATE, "face_cascade", None)
+    if face_cascade is None:
+        face_cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        )
+        _THREAD_STATE.face_cascade = face_cascade
+    return face_cascade
+
+
+def downscale(image, max_dim):
+    """Shrink image so its longest side is at most max_dim (never upscales)"""
+    h, w = image.shape[:2]
+    scale = max_dim / max(h, w)
+    if scale < 1:
+        image = cv2.resize(
+            image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+        )
+    return image
+
+
+def rotate_image(image, rotate_code, in_place=False):
+    """
+    Rotate image by a cv2 rotate code, or return it unchanged for None.
+
+    With in_place, a 180° rotation is flipped within the image's own buffer
+    instead of allocating a new one; the caller must not need the original.
+    """
+    # cv2.ROTATE_90_CLOCKWISE is 0, so compare against None explicitly
+    if rotate_code is None:
+        return image
+    if in_place and rotate_code == cv2.ROTATE_180:
+        return cv2.flip(image, -1, dst=image)
+    return cv2.rotate(image, rotate_code)
+
+
+def rotated_view(image, angle):
+    """
+    Rotate image clockwise by a multiple of 90° as a numpy view (no copy).
+
+    180° is the reversed-stride view image[::-1, ::-1]; 90° and 270° are
+    transposed views.
+    """
+    return np.rot90(image, -angle // 90)
+
+
+def find_faces(gray):
+    """Return the (x, y, w, h) face boxes found in a grayscale image, as-is"""
+    face_detector = get_face_detector()
+    if face_detector is not None:
+        # YuNet wants a 3-channel image matching its configured input size
+        h, w = gray.shape
+        face_detector.setInputSize((w, h))
+        _, faces = face_detector.detect(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR))
+        return np.empty((0, 4)) if faces is None else faces[:, :4]
+
+    if cv2.ocl.useOpenCL():
+        # Uploading to a UMat lets OpenCV dispatch the cascade to OpenCL
+        gray = cv2.UMat(gray)
+
+    faces = get_face_cascade().detectMultiScale(
+        gray, scaleFactor=1.1, minNeighbors=4, minSize=(24, 24)
     )
-    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4)
-    return len(faces) > 0
+    return np.asarray(faces).reshape(-1, 4)
+
+
+def detect_faces(gray):
+    """Return True if faces detected in a grayscale image, else False"""
+    # Detection runtime scales with pixel count; faces that tell us the
+    # orientation survive a downscale to FACE_DETECTION_MAX_DIM
+    return len(find_faces(downscale(gray, FACE_DETECTION_MAX_DIM))) > 0
+
+
+def find_face_rotation(gray):
+    """
+    Find the first of FACE_ROTATIONS in which faces are detected.
+
+    0° is searched on its own first, since most scans are already upright.
+    The remaining rotations are tiled side by side into one canvas, separated
+    by FACE_TILE_GAP blank pixels, and searched with a single detector call;
+    each face is credited to the tile that fully contains it.
+
+    Args:
+        gray: Grayscale detection proxy, at most FACE_DETECTION_MAX_DIM
+            pixels on its longest side
+
+    Returns:
+        (angle, rotate_code) tuple, or None if no faces were found
+    """
+    (angle, rotate_code), *others = FACE_ROTATIONS
+    if detect_faces(rotate_image(gray, rotate_code)):
+        return angle, rotate_code
+    if not others:
+        return None
+
+    tiles = [rotate_image(gray, rotate_code) for _, rotate_code in others]
+    height = max(tile.shape[0] for tile in tiles)
+    width = sum(tile.shape[1] for tile in tiles) + FACE_TILE_GAP * (len(tiles) - 1)
+    canvas = np.zeros((height, width), dtype=gray.dtype)
+    offsets = []
+    x = 0
+    for tile in tiles:
+        canvas[: tile.shape[0], x : x + tile.shape[1]] = tile
+        offsets.append(x)
+        x += tile.shape[1] + FACE_TILE_GAP
+
+    faces = find_faces(canvas)
+    for rotation, tile, offset in zip(others, tiles, offsets):
+        left, right = offset, offset + tile.shape[1]
+        if any(left <= fx and fx + fw <= right for fx, _, fw, _ in faces):
+            return rotation
+    return None
+
+
+def _has_confident_detection(result, confidence_threshold):
+    """Return True if a single YOLO result has a box above the threshold"""
+    boxes = getattr(result, "boxes", None)
+    if boxes is None:
+        # For OBB models, check oriented bounding boxes
+        boxes = getattr(result, "obb", None)
+    if boxes is None or boxes.conf is None:
+        return False
+    # Compare on the inference device so only one bool syncs back to the CPU
+    confidences = boxes.conf
+    return bool(confidences.numel() and (confidences >= confidence_threshold).any())
+
+
+def detect_objects_yolo_batch(images, model, confidence_threshold=0.5):
+    """
+    Detect objects in several images with a single YOLO forward pass.
+
+    Args:
+        images: List of OpenCV image arrays
+        model: YOLO model instance
+        confidence_threshold: Minimum confidence for detection
+
+    Returns:
+        list[bool]: For each image, True if objects detected with sufficient
+        confidence
+    """
+    try:
+        # Run inference on the whole batch at once
+        results = model(images, imgsz=YOLO_IMGSZ, verbose=False)
+        return [
+            _has_confident_detection(result, confidence_threshold)
+            for result in results
+        ]
+    except Exception as e:
+        logging.debug(f"YOLO detection failed: {e}")
+        return [False] * len(images)
 
 
 def detect_objects_yolo(image, model, confidence_threshold=0.5):
@@ -49,83 +360,421 @@ def detect_objects_yolo(image, model, confidence_threshold=0.5):
     Returns:
         bool: True if objects detected with sufficient confidence
     """
+    return any(detect_objects_yolo_batch([image], model, confidence_threshold))
+
+
+def get_yolo_model():
+    """Load the shared YOLO model once, returning None on failure"""
+    global _YOLO_MODEL, _YOLO_LOAD_FAILED
+    with _YOLO_LOCK:
+        # Don't retry a failed load for every image
+        if _YOLO_MODEL is None and not _YOLO_LOAD_FAILED:
+            try:
+                # Use bundled or default model, preferring an accelerated export
+                model_path = get_exported_model_path(get_model_path())
+                _YOLO_MODEL = YOLO(model_path, task="detect")
+            except Exception as e:
+                _YOLO_LOAD_FAILED = True
+                logging.debug(f"Failed to load YOLO model: {e}")
+        return _YOLO_MODEL
+
+
+def read_image_header(image_path):
+    """
+    Read an image's EXIF orientation tag and size.
+
+    Only reads the file header; the pixels are not decoded.
+
+    Args:
+        image_path: Path to the image file
+
+    Returns:
+        tuple: (orientation, (width, height)). The orientation is None when
+        the tag is missing, and both are None when the file can't be opened.
+    """
     try:
-        # Run inference
-        results = model(image, verbose=False)
-
-        # Check if any detections meet confidence threshold
-        for result in results:
-            if hasattr(result, "boxes") and result.boxes is not None:
-                confidences = result.boxes.conf.cpu().numpy()
-                if len(confidences) > 0 and max(confidences) >= confidence_threshold:
-                    return True
-            # For OBB models, check oriented bounding boxes
-            elif hasattr(result, "obb") and result.obb is not None:
-                confidences = result.obb.conf.cpu().numpy()
-                if len(confidences) > 0 and max(confidences) >= confidence_threshold:
-                    return True
-        return False
+        with _PIL_OPEN(image_path) as image:
+            return image.getexif().get(EXIF_ORIENTATION_TAG), image.size
     except Exception as e:
-        logging.debug(f"YOLO detection failed: {e}")
-        return False
+        logging.debug(f"Could not read image header from {image_path}: {e}")
+        return None, None
+
+
+def _load_turbojpeg():
+    """Return a TurboJPEG decoder, or None if libjpeg-turbo isn't available"""
+    if TurboJPEG is None:
+        return None
+    try:
+        return TurboJPEG()
+    except (OSError, RuntimeError):
+        # No logging here: this runs at import, and logging.debug() would
+        # install a default handler before the CLI configures --verbose
+        return None
+
 
+# Shared decoder; PyTurboJPEG creates a fresh handle per call, so threads can share it
+_TURBOJPEG = _load_turbojpeg()
 
-def auto_rotate(image_path):
+
+def _jpeg_scaling_factor(width, height, max_dim):
+    """Pick the smallest libjpeg-turbo scaling factor that keeps max_dim pixels"""
+    candidates = [
+        (num, denom)
+        for num, denom in _TURBOJPEG.scaling_factors
+        if num <= denom and max(width, height) * num / denom >= max_dim
+    ]
+    return min(candidates, key=lambda factor: factor[0] / factor[1], default=None)
+
+
+# OpenCV's DCT-scaled JPEG decodes, largest reduction first
+_REDUCED_GRAYSCALE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+
+def _reduced_grayscale_flag(size, max_dim):
+    """Pick the largest cv2.imread reduction that keeps max_dim pixels"""
+    if size is None:
+        return cv2.IMREAD_GRAYSCALE
+    for factor, flag in _REDUCED_GRAYSCALE_FLAGS:
+        if max(size) / factor >= max_dim:
+            return flag
+    return cv2.IMREAD_GRAYSCALE
+
+
+def is_jpeg(image_path):
+    """Check whether a path has a JPEG extension"""
+    return os.path.splitext(image_path)[1].lower() in (".jpg", ".jpeg")
+
+
+def load_image(image_path):
+    """Load a full-resolution BGR image, logging and returning None on failure"""
+    img = cv2.imread(image_path)
+    if img is None:
+        logging.debug(f"Could not load image: {image_path}")
+    return img
+
+
+def load_gray_proxy(image_path, max_dim, use_turbojpeg=True, size=None):
     """
-    Auto-rotate image based on detected features.
+    Load an image as grayscale with its longest side at most max_dim.
 
-    First tries face detection, if no faces found, tries object detection.
+    JPEGs are decoded straight to grayscale at a reduced DCT scale, skipping
+    most of the full-resolution decode: through libjpeg-turbo when available,
+    otherwise through cv2.imread's reduced modes. Other files are decoded in
+    full by cv2.imread.
 
     Args:
         image_path: Path to the image file
+        max_dim: Longest side of the returned image
+        use_turbojpeg: Allow the libjpeg-turbo path. It ignores EXIF
+            orientation, so callers disable it for images with that tag.
+        size: (width, height) from read_image_header, if the caller already
+            has it; otherwise the header is read again when needed
+
+    Returns:
+        Grayscale image array, or None if the image could not be loaded
     """
-    img = cv2.imread(image_path)
-    if img is None:
+    jpeg = is_jpeg(image_path)
+    if use_turbojpeg and _TURBOJPEG is not None and jpeg:
+        try:
+            with open(image_path, "rb") as f:
+                jpeg_buf = f.read()
+            width, height, _, _ = _TURBOJPEG.decode_header(jpeg_buf)
+            gray = _TURBOJPEG.decode(
+                jpeg_buf,
+                pixel_format=TJPF_GRAY,
+                scaling_factor=_jpeg_scaling_factor(width, height, max_dim),
+            )
+            return downscale(gray[:, :, 0], max_dim)
+        except Exception as e:
+            logging.debug(f"libjpeg-turbo could not decode {image_path}: {e}")
+
+    flag = cv2.IMREAD_GRAYSCALE
+    if jpeg:
+        if size is None:
+            _, size = read_image_header(image_path)
+        flag = _reduced_grayscale_flag(size, max_dim)
+    gray = cv2.imread(image_path, flag)
+    if gray is None:
         logging.debug(f"Could not load image: {image_path}")
+        return None
+    return downscale(gray, max_dim)
+
+
+def save_image(image_path, image):
+    """
+    Overwrite image_path with a BGR image, encoding it straight from OpenCV.
+
+    Returns:
+        bool: True if the image was written
+    """
+    if not cv2.imwrite(image_path, image, [cv2.IMWRITE_JPEG_QUALITY, 95]):
+        logging.warning(f"Could not save image: {image_path}")
+        return False
+    return True
+
+
+def open_cache(root_dir):
+    """
+    Open the results cache in root_dir so reruns skip processed images.
+
+    Args:
+        root_dir: Directory being processed; the cache lives at its top level
+    """
+    global _CACHE
+    cache_path = os.path.join(root_dir, CACHE_FILENAME)
+    try:
+        cache = sqlite3.connect(cache_path, check_same_thread=False)
+        cache.execute("PRAGMA journal_mode=WAL")
+        cache.execute("PRAGMA synchronous=NORMAL")
+        cache.execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, angle INT)"
+        )
+    except sqlite3.Error as e:
+        logging.debug(f"Could not open results cache {cache_path}: {e}")
         return
+    with _CACHE_LOCK:
+        _CACHE = cache
 
-    for angle, rotate_code in [
-        (0, None),
-        (90, cv2.ROTATE_90_CLOCKWISE),
-        (180, cv2.ROTATE_180),
-        (270, cv2.ROTATE_90_COUNTERCLOCKWISE),
-    ]:
-        rotated = cv2.rotate(img, rotate_code) if rotate_code else img
-
-        # First try face detection
-        if detect_faces(rotated):
-            # Save back (overwrite)
-            Image.fromarray(cv2.cvtColor(rotated, cv2.COLOR_BGR2RGB)).save(image_path)
-            logging.debug(f"✔ Rotated {image_path} to {angle}° (faces detected)")
-            return
 
-    # If no faces found at any angle, try object detection as fallback
+def close_cache():
+    """Close the results cache, if open"""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is not None:
+            _CACHE.close()
+            _CACHE = None
+
+
+def _cache_key(image_path):
+    """Identify a file version by path, size and modification time"""
+    stat = os.stat(image_path)
+    return f"{os.path.abspath(image_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def is_cached(image_path):
+    """Return True if this version of the image was already processed"""
+    if _CACHE is None:
+        return False
     try:
-        model = YOLO(get_model_path())  # Use bundled or default model
-        for angle, rotate_code in [
-            (0, None),
-            (90, cv2.ROTATE_90_CLOCKWISE),
-            (180, cv2.ROTATE_180),
-            (270, cv2.ROTATE_90_COUNTERCLOCKWISE),
-        ]:
-            rotated = cv2.rotate(img, rotate_code) if rotate_code else img
-
-            if detect_objects_yolo(rotated, model, 0.5):  # Use default confidence
-                # Save back (overwrite)
-                Image.fromarray(cv2.cvtColor(rotated, cv2.COLOR_BGR2RGB)).save(
-                    image_path
-                )
-                logging.debug(f"✔ Rotated {image_path} to {angle}° (objects detected)")
-                return
-    except Exception as e:
-        logging.debug(f"Failed to load YOLO model: {e}")
+        key = _cache_key(image_path)
+        with _CACHE_LOCK:
+            row = _CACHE.execute(
+                "SELECT 1 FROM results WHERE key = ?", (key,)
+            ).fetchone()
+    except (OSError, sqlite3.Error) as e:
+        logging.debug(f"Results cache lookup failed for {image_path}: {e}")
+        return False
+    return row is not None
+
+
+def record_result(image_path, angle):
+    """
+    Remember that an image is done, keyed on the file as it is now on disk.
+
+    Args:
+        image_path: Path to the image file (after any rotation was saved)
+        angle: Rotation that was applied, or None if it was left as-is
+    """
+    if _CACHE is None:
+        return
+    try:
+        key = _cache_key(image_path)
+        with _CACHE_LOCK:
+            _CACHE.execute(
+                "INSERT OR REPLACE INTO results (key, angle) VALUES (?, ?)",
+                (key, angle),
+            )
+            _CACHE.commit()
+    except (OSError, sqlite3.Error) as e:
+        logging.debug(f"Could not cache result for {image_path}: {e}")
+
+
+def rotate_by_objects(images, model, confidence_threshold=0.5):
+    """
+    Rotate several images using one batched YOLO pass over all their rotations.
+
+    Args:
+        images: List of (image_path, OpenCV image array) tuples
+        model: YOLO model instance
+        confidence_threshold: Minimum confidence for detection
+
+    Returns:
+        list[bool]: For each image, True if it was rotated and saved
+    """
+    # YOLO letterboxes to YOLO_IMGSZ anyway: shrink each image once, then take
+    # rotation views of the small proxy rather than rotating full-size copies
+    proxies = [downscale(img, YOLO_IMGSZ) for _, img in images]
+    rotations = [
+        rotated_view(proxy, angle) for proxy in proxies for angle, _ in ROTATIONS
+    ]
+    detections = detect_objects_yolo_batch(rotations, model, confidence_threshold)
+
+    saved = []
+    for i, (image_path, img) in enumerate(images):
+        offset = i * len(ROTATIONS)
+        for j, (angle, rotate_code) in enumerate(ROTATIONS):
+            if detections[offset + j]:
+                # Save back (overwrite) at full resolution
+                rotated = rotate_image(img, rotate_code, in_place=True)
+                is_saved = save_image(image_path, rotated)
+                if is_saved:
+                    record_result(image_path, angle)
+                    logging.debug(
+                        f"✔ Rotated {image_path} to {angle}° (objects detected)"
+                    )
+                saved.append(is_saved)
+                break
+        else:
+            logging.debug(f"⚠ No faces or objects found in {image_path}, left as-is.")
+            record_result(image_path, None)
+            saved.append(False)
+    return saved
+
+
+def auto_rotate(image_path, object_fallback=True):
+    """
+    Auto-rotate image based on detected features.
+
+    Skips images recorded in the results cache and trusts an EXIF orientation
+    tag when present. Otherwise first tries face detection, if no faces found,
+    tries object detection.
+
+    Args:
+        image_path: Path to the image file
+        object_fallback: Run object detection when no faces are found. When
+            False the fallback is left to the caller, which can batch it
+            across images with rotate_by_objects.
+
+    Returns:
+        bool: False if no faces were found and the object detection fallback
+        was skipped, True otherwise
+    """
+    if is_cached(image_path):
+        logging.debug(f"↷ Skipped {image_path} (already processed)")
+        return True
+
+    orientation, size = read_image_header(image_path)
+    if orientation in EXIF_ORIENTATION_ANGLES:
+        img = load_image(image_path)
+        if img is not None:
+            # cv2.imread already applied the EXIF orientation, and cv2.imwrite
+            # drops the tag, so saving bakes the rotation into the pixels
+            angle = EXIF_ORIENTATION_ANGLES[orientation]
+            if save_image(image_path, img):
+                record_result(image_path, angle)
+                logging.debug(f"✔ Rotated {image_path} to {angle}° (EXIF orientation)")
+        return True
+
+    # Detection only needs a small grayscale proxy: decode it once, then
+    # rotate it instead of the full BGR image. Only JPEGs have a reduced
+    # decode, so other formats are decoded in full once and reused for saving
+    img = None
+    if is_jpeg(image_path):
+        gray = load_gray_proxy(
+            image_path,
+            FACE_DETECTION_MAX_DIM,
+            use_turbojpeg=orientation in (None, 1),
+            size=size,
+        )
+    else:
+        img = load_image(image_path)
+        gray = None
+        if img is not None:
+            gray = downscale(
+                cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), FACE_DETECTION_MAX_DIM
+            )
+    if gray is None:
+        return True
+
+    # First try face detection
+    face_rotation = find_face_rotation(gray)
+    if face_rotation is not None:
+        angle, rotate_code = face_rotation
+        # Decode at full resolution only to save back (overwrite)
+        if img is None:
+            img = load_image(image_path)
+        if img is not None:
+            rotated = rotate_image(img, rotate_code, in_place=True)
+            if save_image(image_path, rotated):
+                record_result(image_path, angle)
+                logging.debug(f"✔ Rotated {image_path} to {angle}° (faces detected)")
+        return True
+
+    if not object_fallback:
+        return False
 
-    logging.debug(f"⚠ No faces or objects found in {image_path}, left as-is.")
+    # If no faces found at any angle, try object detection as fallback
+    model = get_yolo_model()
+    if model is not None:
+        if img is None:
+            img = load_image(image_path)
+        if img is not None:
+            rotate_by_objects([(image_path, img)], model, 0.5)
+    else:
+        logging.debug(f"⚠ No faces or objects found in {image_path}, left as-is.")
+    return True
 
 
 def process_single_image(image_path):
-    """Helper function for multiprocessing"""
-    auto_rotate(image_path)
+    """
+    Helper function for the thread pool
+
+    Returns:
+        The image path if it still needs object detection, else None
+    """
+    if auto_rotate(image_path, object_fallback=False):
+        return None
+    return image_path
+
+
+def process_pending_images(image_paths):
+    """
+    Run the object detection fallback on images without faces.
+
+    Images are fed to YOLO in batches of YOLO_BATCH_SIZE rotations, so a
+    single forward pass covers several images at once.
+
+    Args:
+        image_paths: Paths of images where no faces were found
+    """
+    model = get_yolo_model()
+    if model is None:
+        for image_path in image_paths:
+            logging.debug(f"⚠ No faces or objects found in {image_path}, left as-is.")
+        return
+
+    images_per_batch = max(1, YOLO_BATCH_SIZE // len(ROTATIONS))
+    with tqdm(total=len(image_paths), desc="Detecting objects") as progress:
+        for start in range(0, len(image_paths), images_per_batch):
+            batch_paths = image_paths[start : start + images_per_batch]
+            images = []
+            for image_path in batch_paths:
+                img = load_image(image_path)
+                if img is not None:
+                    images.append((image_path, img))
+            if images:
+                rotate_by_objects(images, model, 0.5)
+            progress.update(len(batch_paths))
+
+
+def iter_image_paths(root_dir):
+    """Recursively yield image file paths under root_dir, walking it lazily"""
+    try:
+        entries = os.scandir(root_dir)
+    except OSError as e:
+        logging.debug(f"Could not scan directory {root_dir}: {e}")
+        return
+
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_image_paths(entry.path)
+            elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                yield entry.path
 
 
 def process_directory(root_dir):
@@ -135,42 +784,59 @@ def process_directory(root_dir):
     2. If no faces found, try object detection
     3. If neither found, leave image unchanged
 
+    Face detection runs in a thread pool (OpenCV releases the GIL); the object
+    detection fallback then runs on this thread so YOLO can batch images that
+    had no faces. Results are cached in CACHE_FILENAME so reruns skip images
+    that haven't changed since they were processed.
+
     Args:
         root_dir: Directory to process
     """
-    # Find all image files
-    image_paths = []
-    for root, _, files in os.walk(root_dir):
-        for f in files:
-            if f.lower().endswith((".png", ".jpg", ".jpeg")):
-                image_paths.append(os.path.join(root, f))
+    # Count image files up front for the progress bar; the paths themselves
+    # are streamed into the pool by a second walk
+    total = sum(1 for _ in iter_image_paths(root_dir))
 
-    if not image_paths:
+    if not total:
         print(f"No images found in {root_dir}")
         return
 
-    print(f"Found {len(image_paths)} images")
+    print(f"Found {total} images")
     print("Detection strategy: Face detection first, object detection as fallback")
 
-    # Process images with multiprocessing
-    with Pool(cpu_count(), initializer=init_worker) as pool:
-        list(
-            tqdm(
-                pool.imap_unordered(process_single_image, image_paths),
-                total=len(image_paths),
-                desc="Processing images",
-            )
-        )
+    open_cache(root_dir)
+    try:
+        # Process images with a thread pool. Every thread already keeps a core
+        # busy, so stop OpenCV from also fanning each call out to all cores
+        workers = cpu_count()
+        chunksize = max(1, min(IMAP_CHUNKSIZE, total // (workers * 4)))
+        opencv_threads = cv2.getNumThreads()
+        cv2.setNumThreads(1)
+        try:
+            with ThreadPool(workers) as pool:
+                pending = [
+                    image_path
+                    for image_path in tqdm(
+                        pool.imap_unordered(
+                            process_single_image,
+                            iter_image_paths(root_dir),
+                            chunksize=chunksize,
+                        ),
+                        total=total,
+                        desc="Processing images",
+                    )
+                    if image_path is not None
+                ]
+        finally:
+            # YOLO runs alone on this thread afterwards and may use every core
+            cv2.setNumThreads(opencv_threads)
+
+        if pending:
+            process_pending_images(pending)
+    finally:
+        close_cache()
 
     print("Processing complete!")
 
-def init_worker():
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format=f"[%(processName)s] %(levelname)s: %(message)s",
-        force=True
-    )
-
 if __name__ == "__main__":
     from multiprocessing import freeze_support
 
@@ -7,10 +7,13 @@ import os
 import shutil
 import sys
 import tempfile
-from unittest.mock import Mock, patch
+import threading
+from unittest.mock import ANY, MagicMock, Mock, patch
 
+import cv2
 import numpy as np
 import pytest
+import torch
 from PIL import Image
 
 # Add parent directory to path to import rotate module
@@ -18,11 +21,28 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from rotate import (
     auto_rotate,
+    close_cache,
     detect_faces,
     detect_objects_yolo,
+    detect_objects_yolo_batch,
+    find_face_rotation,
+    get_exported_model_path,
+    get_face_cascade,
+    get_face_detector,
+    get_face_model_path,
     get_model_path,
+    is_cached,
+    iter_image_paths,
+    load_gray_proxy,
+    open_cache,
     process_directory,
+    process_pending_images,
     process_single_image,
+    read_image_header,
+    record_result,
+    rotate_by_objects,
+    rotate_image,
+    rotated_view,
 )
 
 
@@ -42,42 +62,223 @@ class TestImageCreation:
         img[:] = color
         return img
 
+    @staticmethod
+    def create_gray_image(width=640, height=480, value=100):
+        """Create a single-channel grayscale test image"""
+        return np.full((height, width), value, dtype=np.uint8)
+
 
 class TestFaceDetection:
     """Test face detection functionality"""
 
+    def setup_method(self):
+        """Use the Haar cascade even if the YuNet model is installed"""
+        self.detector_patch = patch("rotate.get_face_detector", return_value=None)
+        self.detector_patch.start()
+
+    def teardown_method(self):
+        """Restore the face detector lookup"""
+        self.detector_patch.stop()
+
     def test_detect_faces_empty_image(self):
         """Test face detection on empty image"""
-        test_img = TestImageCreation.create_cv2_image()
+        test_img = TestImageCreation.create_gray_image()
         result = detect_faces(test_img)
         assert result is False, "Should not detect faces in empty image"
 
     def test_detect_faces_with_mock_faces(self):
         """Test face detection with mocked face cascade"""
-        test_img = TestImageCreation.create_cv2_image()
+        test_img = TestImageCreation.create_gray_image()
 
-        with patch("cv2.CascadeClassifier") as mock_cascade_class:
-            mock_cascade = Mock()
-            mock_cascade.detectMultiScale.return_value = np.array(
-                [[10, 10, 50, 50]]
-            )  # Mock face detection
-            mock_cascade_class.return_value = mock_cascade
+        mock_cascade = Mock()
+        mock_cascade.detectMultiScale.return_value = np.array(
+            [[10, 10, 50, 50]]
+        )  # Mock face detection
 
+        with patch("rotate.get_face_cascade", return_value=mock_cascade):
             result = detect_faces(test_img)
             assert result is True, "Should detect mocked faces"
 
     def test_detect_faces_no_faces_found(self):
         """Test face detection when no faces are found"""
-        test_img = TestImageCreation.create_cv2_image()
+        test_img = TestImageCreation.create_gray_image()
 
-        with patch("cv2.CascadeClassifier") as mock_cascade_class:
-            mock_cascade = Mock()
-            mock_cascade.detectMultiScale.return_value = np.array([])  # No faces
-            mock_cascade_class.return_value = mock_cascade
+        mock_cascade = Mock()
+        mock_cascade.detectMultiScale.return_value = np.array([])  # No faces
 
+        with patch("rotate.get_face_cascade", return_value=mock_cascade):
             result = detect_faces(test_img)
             assert result is False, "Should not detect faces when none found"
 
+    @patch("rotate.cv2.ocl.useOpenCL", return_value=False)
+    def test_detect_faces_downscales_large_images(self, mock_use_opencl):
+        """Test that large images are downscaled before face detection"""
+        test_img = TestImageCreation.create_gray_image(width=3000, height=2000)
+
+        mock_cascade = Mock()
+        mock_cascade.detectMultiScale.return_value = np.array([])
+
+        with patch("rotate.get_face_cascade", return_value=mock_cascade):
+            detect_faces(test_img)
+
+        gray = mock_cascade.detectMultiScale.call_args.args[0]
+        assert max(gray.shape) == 640, "Should search a 640px proxy"
+
+    @patch("rotate.cv2.ocl.useOpenCL", return_value=True)
+    def test_detect_faces_uses_umat_with_opencl(self, mock_use_opencl):
+        """Test that detection runs on a UMat when OpenCL is enabled"""
+        test_img = TestImageCreation.create_gray_image()
+
+        mock_cascade = Mock()
+        mock_cascade.detectMultiScale.return_value = np.array([])
+
+        with patch("rotate.get_face_cascade", return_value=mock_cascade):
+            detect_faces(test_img)
+
+        gray = mock_cascade.detectMultiScale.call_args.args[0]
+        assert isinstance(gray, cv2.UMat), "Should hand OpenCV a UMat"
+
+    @patch("rotate.find_faces")
+    def test_find_face_rotation_upright(self, mock_find_faces):
+        """Test that an upright hit returns without building the canvas"""
+        test_img = TestImageCreation.create_gray_image()
+        mock_find_faces.return_value = np.array([[10, 10, 50, 50]])
+
+        result = find_face_rotation(test_img)
+
+        assert result == (0, None), "Should report 0°"
+        assert mock_find_faces.call_count == 1, "Should stop after the 0° pass"
+
+    @patch("rotate.find_faces")
+    def test_find_face_rotation_tiles_remaining_angles(self, mock_find_faces):
+        """Test that 90° and 270° share one detector call on a tiled canvas"""
+        test_img = TestImageCreation.create_gray_image(width=640, height=480)
+        # Nothing at 0°, then a face inside the second (270°) tile
+        mock_find_faces.side_effect = [
+            np.empty((0, 4)),
+            np.array([[480 + 32 + 100, 100, 50, 50]]),
+        ]
+
+        result = find_face_rotation(test_img)
+
+        assert result == (270, cv2.ROTATE_90_COUNTERCLOCKWISE), "Should report 270°"
+        canvas = mock_find_faces.call_args.args[0]
+        assert canvas.shape == (640, 480 * 2 + 32), "Should tile both rotations"
+        assert mock_find_faces.call_count == 2, "Should never try 180° for faces"
+
+    @patch("rotate.find_faces")
+    def test_find_face_rotation_prefers_first_tile(self, mock_find_faces):
+        """Test that 90° wins over 270° when both tiles contain faces"""
+        test_img = TestImageCreation.create_gray_image(width=640, height=480)
+        mock_find_faces.side_effect = [
+            np.empty((0, 4)),
+            np.array([[600, 100, 50, 50], [10, 10, 50, 50]]),
+        ]
+
+        result = find_face_rotation(test_img)
+
+        assert result == (90, cv2.ROTATE_90_CLOCKWISE), "Should report 90°"
+
+    @patch("rotate.find_faces")
+    def test_find_face_rotation_ignores_boxes_across_tiles(self, mock_find_faces):
+        """Test that a box spanning the gap is not credited to either tile"""
+        test_img = TestImageCreation.create_gray_image(width=640, height=480)
+        mock_find_faces.side_effect = [
+            np.empty((0, 4)),
+            np.array([[450, 100, 80, 80]]),
+        ]
+
+        assert find_face_rotation(test_img) is None, "Should find no rotation"
+
+    def test_find_face_rotation_empty_image(self):
+        """Test the tiled search on an image without faces"""
+        test_img = TestImageCreation.create_gray_image()
+
+        assert find_face_rotation(test_img) is None, "Should find no faces"
+
+    def test_get_face_cascade_is_cached(self):
+        """Test that the Haar cascade is only loaded once per thread"""
+        with patch("rotate._THREAD_STATE", threading.local()), patch(
+            "cv2.CascadeClassifier"
+        ) as mock_cascade_class:
+            first = get_face_cascade()
+            second = get_face_cascade()
+
+        assert first is second, "Should reuse the same cascade instance"
+        mock_cascade_class.assert_called_once()
+
+    def test_get_face_cascade_per_thread(self):
+        """Test that each thread gets its own Haar cascade"""
+        cascades = []
+
+        with patch("rotate._THREAD_STATE", threading.local()), patch(
+            "cv2.CascadeClassifier", side_effect=lambda path: Mock()
+        ):
+            cascades.append(get_face_cascade())
+            thread = threading.Thread(target=lambda: cascades.append(get_face_cascade()))
+            thread.start()
+            thread.join()
+
+        assert cascades[0] is not cascades[1], "Threads should not share a cascade"
+
+
+class TestYuNetFaceDetection:
+    """Test YuNet face detection functionality"""
+
+    def test_detect_faces_with_yunet(self):
+        """Test that YuNet is used when its model is available"""
+        test_img = TestImageCreation.create_gray_image(width=640, height=480)
+
+        mock_detector = Mock()
+        mock_detector.detect.return_value = (1, np.array([[10, 10, 50, 50]]))
+
+        with patch("rotate.get_face_detector", return_value=mock_detector), patch(
+            "rotate.get_face_cascade"
+        ) as mock_get_cascade:
+            result = detect_faces(test_img)
+
+        assert result is True, "Should detect faces found by YuNet"
+        mock_detector.setInputSize.assert_called_once_with((640, 480))
+        image = mock_detector.detect.call_args.args[0]
+        assert image.shape == (480, 640, 3), "Should pass YuNet a BGR image"
+        mock_get_cascade.assert_not_called()
+
+    def test_detect_faces_with_yunet_no_faces(self):
+        """Test YuNet reporting no faces"""
+        test_img = TestImageCreation.create_gray_image()
+
+        mock_detector = Mock()
+        mock_detector.detect.return_value = (1, None)
+
+        with patch("rotate.get_face_detector", return_value=mock_detector):
+            result = detect_faces(test_img)
+
+        assert result is False, "Should not detect faces when YuNet finds none"
+
+    def test_get_face_detector_without_model(self):
+        """Test fallback to Haar when the YuNet model is missing"""
+        with patch("rotate._THREAD_STATE", threading.local()), patch(
+            "rotate.get_face_model_path", return_value=None
+        ):
+            assert get_face_detector() is None, "Should fall back to Haar"
+
+    def test_get_face_model_path_missing(self):
+        """Test face model path when the model file is not present"""
+        with patch("sys.frozen", False, create=True), patch(
+            "os.path.exists", return_value=False
+        ):
+            assert get_face_model_path() is None, "Should report a missing model"
+
+    def test_get_face_model_path_frozen_with_bundle(self):
+        """Test face model path when running as PyInstaller bundle"""
+        with patch("sys.frozen", True, create=True), patch(
+            "sys._MEIPASS", "/fake/bundle/path", create=True
+        ), patch("os.path.exists", return_value=True):
+            result = get_face_model_path()
+
+        expected_path = "/fake/bundle/path/face_detection_yunet_2023mar.onnx"
+        assert result == expected_path, "Should return bundled face model path"
+
 
 class TestYOLODetection:
     """Test YOLO object detection functionality"""
@@ -90,9 +291,7 @@ class TestYOLODetection:
         mock_model = Mock()
         mock_result = Mock()
         mock_result.boxes = Mock()
-        mock_result.boxes.conf.cpu.return_value.numpy.return_value = np.array(
-            [0.8, 0.9]
-        )  # High confidence
+        mock_result.boxes.conf = torch.tensor([0.8, 0.9])  # High confidence
         mock_result.obb = None
         mock_model.return_value = [mock_result]
 
@@ -106,9 +305,7 @@ class TestYOLODetection:
         mock_model = Mock()
         mock_result = Mock()
         mock_result.boxes = Mock()
-        mock_result.boxes.conf.cpu.return_value.numpy.return_value = np.array(
-            [0.2, 0.3]
-        )  # Low confidence
+        mock_result.boxes.conf = torch.tensor([0.2, 0.3])  # Low confidence
         mock_result.obb = None
         mock_model.return_value = [mock_result]
 
@@ -123,9 +320,7 @@ class TestYOLODetection:
         mock_result = Mock()
         mock_result.boxes = None
         mock_result.obb = Mock()
-        mock_result.obb.conf.cpu.return_value.numpy.return_value = np.array(
-            [0.7]
-        )  # Good confidence
+        mock_result.obb.conf = torch.tensor([0.7])  # Good confidence
         mock_model.return_value = [mock_result]
 
         result = detect_objects_yolo(test_img, mock_model, confidence_threshold=0.5)
@@ -141,6 +336,54 @@ class TestYOLODetection:
         result = detect_objects_yolo(test_img, mock_model)
         assert result is False, "Should return False on exception"
 
+    def test_detect_objects_yolo_stays_on_device(self):
+        """Test that confidences are compared without copying them to the CPU"""
+        test_img = TestImageCreation.create_cv2_image()
+
+        mock_result = Mock()
+        mock_result.boxes.conf = Mock(wraps=torch.tensor([0.9]))
+        mock_result.boxes.conf.numel.return_value = 1
+        mock_result.boxes.conf.__ge__ = Mock(return_value=torch.tensor([True]))
+        mock_model = Mock(return_value=[mock_result])
+
+        result = detect_objects_yolo(test_img, mock_model, confidence_threshold=0.5)
+
+        assert result is True, "Should detect objects with high confidence"
+        mock_result.boxes.conf.cpu.assert_not_called()
+
+    def test_detect_objects_yolo_batch_single_call(self):
+        """Test batched YOLO detection runs one forward pass for all images"""
+        images = [TestImageCreation.create_cv2_image() for _ in range(4)]
+
+        def make_result(confidences):
+            result = Mock()
+            result.boxes = Mock()
+            result.boxes.conf = torch.tensor(confidences)
+            result.obb = None
+            return result
+
+        mock_model = Mock()
+        mock_model.return_value = [
+            make_result([]),
+            make_result([0.2]),
+            make_result([0.9]),
+            make_result([0.6, 0.1]),
+        ]
+
+        result = detect_objects_yolo_batch(images, mock_model, confidence_threshold=0.5)
+        assert result == [False, False, True, True], "Should report per-image hits"
+        mock_model.assert_called_once_with(images, imgsz=320, verbose=False)
+
+    def test_detect_objects_yolo_batch_exception_handling(self):
+        """Test batched YOLO detection exception handling"""
+        images = [TestImageCreation.create_cv2_image() for _ in range(2)]
+
+        mock_model = Mock()
+        mock_model.side_effect = Exception("Test exception")
+
+        result = detect_objects_yolo_batch(images, mock_model)
+        assert result == [False, False], "Should return False for every image"
+
 
 class TestModelPath:
     """Test model path functionality"""
@@ -173,6 +416,136 @@ class TestModelPath:
             ), "Should return default model name if bundle not found"
 
 
+class TestExportedModelPath:
+    """Test accelerated YOLO model export"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.model_path = os.path.join(self.temp_dir, "yolo11n.pt")
+        open(self.model_path, "w").close()
+
+    def teardown_method(self):
+        """Clean up test fixtures"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_get_exported_model_path_frozen(self):
+        """Test that bundled binaries use the bundled weights as-is"""
+        with patch("sys.frozen", True, create=True), patch("rotate.YOLO") as mock_yolo:
+            result = get_exported_model_path(self.model_path)
+
+        assert result == self.model_path, "Should not export inside a bundle"
+        mock_yolo.assert_not_called()
+
+    @patch("rotate.find_spec", return_value=None)
+    def test_get_exported_model_path_no_backend(self, mock_find_spec):
+        """Test fallback to the PyTorch weights without an export backend"""
+        with patch("sys.frozen", False, create=True):
+            result = get_exported_model_path(self.model_path)
+
+        assert result == self.model_path, "Should fall back to the .pt weights"
+
+    @patch("rotate.torch.cuda.is_available", return_value=False)
+    @patch("rotate.find_spec", return_value=Mock())
+    def test_get_exported_model_path_cached_onnx(self, mock_find_spec, mock_cuda):
+        """Test that an existing ONNX export is reused"""
+        onnx_path = os.path.join(self.temp_dir, "yolo11n.onnx")
+        open(onnx_path, "w").close()
+
+        with patch("sys.frozen", False, create=True), patch("rotate.YOLO") as mock_yolo:
+            result = get_exported_model_path(self.model_path)
+
+        assert result == onnx_path, "Should reuse the cached ONNX model"
+        mock_yolo.assert_not_called()
+
+    @patch("rotate.torch.cuda.is_available", return_value=False)
+    @patch("rotate.find_spec", return_value=Mock())
+    def test_get_exported_model_path_resolves_weights(self, mock_find_spec, mock_cuda):
+        """Test that exports are looked up next to the resolved weights"""
+        onnx_path = os.path.join(self.temp_dir, "yolo11n.onnx")
+        open(onnx_path, "w").close()
+
+        with patch("sys.frozen", False, create=True), patch(
+            "rotate.attempt_download_asset", return_value=self.model_path
+        ) as mock_resolve, patch("rotate.YOLO") as mock_yolo:
+            result = get_exported_model_path("yolo11n.pt")
+
+        mock_resolve.assert_called_once_with("yolo11n.pt")
+        assert result == onnx_path, "Should reuse the export in the weights dir"
+        mock_yolo.assert_not_called()
+
+    @patch("rotate.torch.cuda.is_available", return_value=True)
+    @patch("rotate.find_spec", return_value=Mock())
+    def test_get_exported_model_path_exports_engine(self, mock_find_spec, mock_cuda):
+        """Test that a TensorRT FP16 engine is exported on first run with CUDA"""
+        engine_path = os.path.join(self.temp_dir, "yolo11n.engine")
+
+        with patch("sys.frozen", False, create=True), patch("rotate.YOLO") as mock_yolo:
+            mock_yolo.return_value.export.return_value = engine_path
+            result = get_exported_model_path(self.model_path)
+
+        assert result == engine_path, "Should return the exported engine"
+        _, kwargs = mock_yolo.return_value.export.call_args
+        assert kwargs["format"] == "engine" and kwargs["half"] is True
+        assert kwargs["simplify"] is False, "Should not pull in onnxslim"
+
+    @patch("rotate.torch.cuda.is_available", return_value=True)
+    @patch(
+        "rotate.find_spec",
+        side_effect=lambda name: None if name == "tensorrt" else Mock(),
+    )
+    def test_get_exported_model_path_cuda_without_gpu_onnxruntime(
+        self, mock_find_spec, mock_cuda
+    ):
+        """Test that CUDA hosts keep PyTorch when ONNX Runtime is CPU-only"""
+        mock_onnxruntime = Mock()
+        mock_onnxruntime.get_available_providers.return_value = [
+            "CPUExecutionProvider"
+        ]
+
+        with patch("sys.frozen", False, create=True), patch(
+            "rotate.YOLO"
+        ) as mock_yolo, patch.dict(sys.modules, {"onnxruntime": mock_onnxruntime}):
+            result = get_exported_model_path(self.model_path)
+
+        assert result == self.model_path, "Should keep the .pt weights on the GPU"
+        mock_yolo.assert_not_called()
+
+    @patch("rotate.torch.cuda.is_available", return_value=True)
+    @patch(
+        "rotate.find_spec",
+        side_effect=lambda name: None if name == "tensorrt" else Mock(),
+    )
+    def test_get_exported_model_path_cuda_onnx(self, mock_find_spec, mock_cuda):
+        """Test ONNX export on CUDA hosts whose ONNX Runtime has the CUDA provider"""
+        onnx_path = os.path.join(self.temp_dir, "yolo11n.onnx")
+        mock_onnxruntime = Mock()
+        mock_onnxruntime.get_available_providers.return_value = [
+            "CUDAExecutionProvider",
+            "CPUExecutionProvider",
+        ]
+
+        with patch("sys.frozen", False, create=True), patch(
+            "rotate.YOLO"
+        ) as mock_yolo, patch.dict(sys.modules, {"onnxruntime": mock_onnxruntime}):
+            mock_yolo.return_value.export.return_value = onnx_path
+            result = get_exported_model_path(self.model_path)
+
+        assert result == onnx_path, "Should return the exported ONNX model"
+        _, kwargs = mock_yolo.return_value.export.call_args
+        assert kwargs["format"] == "onnx" and kwargs["half"] is False
+
+    @patch("rotate.torch.cuda.is_available", return_value=False)
+    @patch("rotate.find_spec", return_value=Mock())
+    def test_get_exported_model_path_export_failure(self, mock_find_spec, mock_cuda):
+        """Test fallback to the PyTorch weights when export fails"""
+        with patch("sys.frozen", False, create=True), patch("rotate.YOLO") as mock_yolo:
+            mock_yolo.return_value.export.side_effect = Exception("Test exception")
+            result = get_exported_model_path(self.model_path)
+
+        assert result == self.model_path, "Should fall back to the .pt weights"
+
+
 class TestAutoRotate:
     """Test auto rotation functionality"""
 
@@ -189,59 +562,154 @@ class TestAutoRotate:
         """Clean up test fixtures"""
         shutil.rmtree(self.temp_dir)
 
-    @patch("rotate.detect_faces")
-    @patch("rotate.Image.fromarray")
+    @patch("rotate.find_face_rotation")
+    @patch("rotate.cv2.imwrite")
     def test_auto_rotate_face_detected_at_0_degrees(
-        self, mock_fromarray, mock_detect_faces
+        self, mock_imwrite, mock_find_face_rotation
     ):
         """Test auto rotation when face is detected at 0 degrees"""
-        mock_detect_faces.side_effect = [True, False, False, False]  # Face found at 0°
-        mock_image = Mock()
-        mock_fromarray.return_value = mock_image
+        mock_find_face_rotation.return_value = (0, None)  # Face found at 0°
+        mock_imwrite.return_value = True
 
         auto_rotate(self.test_image_path)
 
-        mock_image.save.assert_called_once_with(self.test_image_path)
+        mock_imwrite.assert_called_once_with(self.test_image_path, ANY, ANY)
+        gray = mock_find_face_rotation.call_args.args[0]
+        assert gray.ndim == 2, "Should run face detection on grayscale"
 
-    @patch("rotate.detect_faces")
-    @patch("rotate.detect_objects_yolo")
-    @patch("rotate.YOLO")
-    @patch("rotate.Image.fromarray")
+    @patch("rotate.find_face_rotation")
+    def test_auto_rotate_png_decodes_once(self, mock_find_face_rotation):
+        """Test that non-JPEG images are decoded once for detection and saving"""
+        mock_find_face_rotation.return_value = (90, cv2.ROTATE_90_CLOCKWISE)
+        png_path = os.path.join(self.temp_dir, "test_image.png")
+        TestImageCreation.create_test_image().save(png_path)
+
+        with patch("rotate.cv2.imread", wraps=cv2.imread) as mock_imread:
+            auto_rotate(png_path)
+
+        assert mock_imread.call_count == 1, "Should reuse the full decode"
+        with Image.open(png_path) as saved:
+            assert saved.size == (480, 640), "Should save the 90° rotation"
+
+    @patch("rotate.find_face_rotation")
+    def test_auto_rotate_saves_rotated_image(self, mock_find_face_rotation):
+        """Test that the rotated image is written back in place"""
+        mock_find_face_rotation.return_value = (90, cv2.ROTATE_90_CLOCKWISE)
+
+        auto_rotate(self.test_image_path)
+
+        with Image.open(self.test_image_path) as saved:
+            assert saved.size == (480, 640), "Should save the 90° rotation"
+
+    @patch("rotate.find_face_rotation")
+    @patch("rotate.detect_objects_yolo_batch")
+    @patch("rotate.get_yolo_model")
+    @patch("rotate.cv2.imwrite")
     def test_auto_rotate_object_detected_fallback(
-        self, mock_fromarray, mock_yolo, mock_detect_objects, mock_detect_faces
+        self,
+        mock_imwrite,
+        mock_get_model,
+        mock_detect_objects,
+        mock_find_face_rotation,
     ):
         """Test auto rotation when no faces but objects detected"""
-        mock_detect_faces.return_value = False  # No faces found
-        mock_detect_objects.side_effect = [
+        mock_model = Mock()
+        mock_get_model.return_value = mock_model
+        mock_find_face_rotation.return_value = None  # No faces found
+        mock_detect_objects.return_value = [
             True,
             False,
             False,
             False,
         ]  # Object found at 0°
-        mock_model = Mock()
-        mock_yolo.return_value = mock_model
-        mock_image = Mock()
-        mock_fromarray.return_value = mock_image
+        mock_imwrite.return_value = True
 
         auto_rotate(self.test_image_path)
 
-        mock_image.save.assert_called_once_with(self.test_image_path)
+        mock_imwrite.assert_called_once_with(self.test_image_path, ANY, ANY)
+        # All four orientations should go through a single batched call
+        mock_detect_objects.assert_called_once_with(ANY, mock_model, 0.5)
+        args, _ = mock_detect_objects.call_args
+        assert len(args[0]) == 4, "Should batch all four rotations"
 
-    @patch("rotate.detect_faces")
-    @patch("rotate.detect_objects_yolo")
-    @patch("rotate.YOLO")
+    @patch("rotate.find_face_rotation")
+    @patch("rotate.detect_objects_yolo_batch")
+    @patch("rotate.get_yolo_model")
     def test_auto_rotate_no_detection(
-        self, mock_yolo, mock_detect_objects, mock_detect_faces
+        self, mock_get_model, mock_detect_objects, mock_find_face_rotation
     ):
         """Test auto rotation when neither faces nor objects are detected"""
-        mock_detect_faces.return_value = False
-        mock_detect_objects.return_value = False
-        mock_model = Mock()
-        mock_yolo.return_value = mock_model
+        mock_find_face_rotation.return_value = None
+        mock_detect_objects.return_value = [False, False, False, False]
 
         # Should not raise exception, just log and continue
         auto_rotate(self.test_image_path)
 
+        mock_get_model.assert_called_once_with()
+        mock_detect_objects.assert_called_once()
+
+    @patch("rotate.find_face_rotation")
+    @patch("rotate.detect_objects_yolo_batch")
+    @patch("rotate._YOLO_LOAD_FAILED", False)
+    @patch("rotate._YOLO_MODEL", None)
+    @patch("rotate.YOLO")
+    def test_auto_rotate_loads_yolo_lazily(
+        self, mock_yolo, mock_detect_objects, mock_find_face_rotation
+    ):
+        """Test that a direct auto_rotate call loads YOLO for the fallback"""
+        mock_find_face_rotation.return_value = None
+        mock_detect_objects.return_value = [False, False, False, False]
+
+        with patch("rotate.get_exported_model_path", side_effect=lambda path: path):
+            auto_rotate(self.test_image_path)
+
+        mock_yolo.assert_called_once()
+        mock_detect_objects.assert_called_once_with(ANY, mock_yolo.return_value, 0.5)
+
+    @patch("rotate.find_face_rotation")
+    @patch("rotate.detect_objects_yolo_batch")
+    @patch("rotate.get_yolo_model", return_value=None)
+    def test_auto_rotate_skips_yolo_without_model(
+        self, mock_get_model, mock_detect_objects, mock_find_face_rotation
+    ):
+        """Test that object detection is skipped when no YOLO model is loaded"""
+        mock_find_face_rotation.return_value = None
+
+        auto_rotate(self.test_image_path)
+
+        mock_detect_objects.assert_not_called()
+
+    @patch("rotate.find_face_rotation")
+    def test_auto_rotate_trusts_exif_orientation(self, mock_find_face_rotation):
+        """Test that an EXIF rotation is applied without running detection"""
+        test_img = TestImageCreation.create_test_image()
+        exif = test_img.getexif()
+        exif[274] = 6  # Rotate 90° clockwise to display
+        test_img.save(self.test_image_path, exif=exif)
+
+        auto_rotate(self.test_image_path)
+
+        mock_find_face_rotation.assert_not_called()
+        with Image.open(self.test_image_path) as saved:
+            assert saved.size == (480, 640), "Should bake in the EXIF rotation"
+            assert 274 not in saved.getexif(), "Should drop the orientation tag"
+
+    @patch("rotate.find_face_rotation")
+    @patch("rotate.get_yolo_model", return_value=None)
+    def test_auto_rotate_upright_exif_runs_detection(
+        self, mock_get_model, mock_find_face_rotation
+    ):
+        """Test that an upright EXIF orientation still runs detection"""
+        test_img = TestImageCreation.create_test_image()
+        exif = test_img.getexif()
+        exif[274] = 1  # Upright
+        test_img.save(self.test_image_path, exif=exif)
+        mock_find_face_rotation.return_value = None
+
+        auto_rotate(self.test_image_path)
+
+        assert mock_find_face_rotation.called, "Should fall through to detection"
+
     def test_auto_rotate_invalid_image_path(self):
         """Test auto rotation with invalid image path"""
         invalid_path = "/nonexistent/path/image.jpg"
@@ -250,6 +718,74 @@ class TestAutoRotate:
         auto_rotate(invalid_path)
 
 
+class TestResultsCache:
+    """Test the persistent results cache"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_image_path = os.path.join(self.temp_dir, "test_image.jpg")
+        TestImageCreation.create_test_image().save(self.test_image_path)
+        open_cache(self.temp_dir)
+
+    def teardown_method(self):
+        """Clean up test fixtures"""
+        close_cache()
+        shutil.rmtree(self.temp_dir)
+
+    def test_cache_records_processed_images(self):
+        """Test that recorded images are reported as cached"""
+        assert not is_cached(self.test_image_path), "Should start empty"
+
+        record_result(self.test_image_path, 90)
+
+        assert is_cached(self.test_image_path), "Should remember the image"
+        assert os.path.exists(os.path.join(self.temp_dir, ".rotate_cache.sqlite"))
+
+    def test_cache_misses_modified_images(self):
+        """Test that changing a file invalidates its cache entry"""
+        record_result(self.test_image_path, None)
+
+        stat = os.stat(self.test_image_path)
+        os.utime(self.test_image_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+        assert not is_cached(self.test_image_path), "Should reprocess edited files"
+
+    def test_cache_persists_across_runs(self):
+        """Test that results survive closing and reopening the cache"""
+        record_result(self.test_image_path, 180)
+        close_cache()
+        open_cache(self.temp_dir)
+
+        assert is_cached(self.test_image_path), "Should reload saved results"
+
+    @patch("rotate.find_face_rotation")
+    def test_auto_rotate_skips_cached_images(self, mock_find_face_rotation):
+        """Test that cached images are not processed again"""
+        record_result(self.test_image_path, None)
+
+        assert auto_rotate(self.test_image_path) is True
+
+        mock_find_face_rotation.assert_not_called()
+
+    @patch("rotate.find_face_rotation")
+    def test_auto_rotate_records_saved_rotation(self, mock_find_face_rotation):
+        """Test that the file as saved is what gets cached"""
+        mock_find_face_rotation.return_value = (90, cv2.ROTATE_90_CLOCKWISE)
+
+        auto_rotate(self.test_image_path)
+
+        assert is_cached(self.test_image_path), "Should cache the rotated file"
+
+    def test_cache_disabled_when_closed(self):
+        """Test that lookups are no-ops without an open cache"""
+        close_cache()
+
+        record_result(self.test_image_path, 0)
+
+        assert not is_cached(self.test_image_path), "Should not cache when closed"
+
+
 class TestProcessDirectory:
     """Test directory processing functionality"""
 
@@ -272,7 +808,7 @@ class TestProcessDirectory:
         """Clean up test fixtures"""
         shutil.rmtree(self.temp_dir)
 
-    @patch("rotate.Pool")
+    @patch("rotate.ThreadPool")
     @patch("rotate.tqdm")
     def test_process_directory_finds_images(self, mock_tqdm, mock_pool):
         """Test that process_directory finds the correct image files"""
@@ -286,7 +822,57 @@ class TestProcessDirectory:
         # Should find 3 image files
         mock_pool_instance.imap_unordered.assert_called_once()
         args, kwargs = mock_pool_instance.imap_unordered.call_args
-        assert len(args[1]) == 3, "Should find 3 image files"
+        assert len(list(args[1])) == 3, "Should find 3 image files"
+
+    def test_iter_image_paths_recurses_subfolders(self):
+        """Test that images in nested folders are found and others skipped"""
+        nested_dir = os.path.join(self.temp_dir, "nested", "deeper")
+        os.makedirs(nested_dir)
+        nested_path = os.path.join(nested_dir, "nested_image.JPG")
+        TestImageCreation.create_test_image().save(nested_path, format="JPEG")
+
+        found = sorted(iter_image_paths(self.temp_dir))
+
+        assert len(found) == 4, "Should find 3 top-level images and 1 nested"
+        assert nested_path in found, "Should match extensions case-insensitively"
+        assert not any(p.endswith(".txt") for p in found), "Should skip non-images"
+
+    @patch("rotate.process_pending_images")
+    @patch("rotate.ThreadPool")
+    @patch("rotate.tqdm")
+    def test_process_directory_batches_pending_images(
+        self, mock_tqdm, mock_pool, mock_process_pending
+    ):
+        """Test that images without faces go to the batched YOLO fallback"""
+        mock_pool_instance = Mock()
+        mock_pool.return_value.__enter__.return_value = mock_pool_instance
+        mock_tqdm.return_value = [None, "a.jpg", None]
+
+        process_directory(self.temp_dir)
+
+        mock_process_pending.assert_called_once_with(["a.jpg"])
+
+    @patch("rotate.process_pending_images")
+    @patch("rotate.cv2.setNumThreads")
+    @patch("rotate.cv2.getNumThreads", return_value=8)
+    @patch("rotate.ThreadPool")
+    @patch("rotate.tqdm")
+    def test_process_directory_caps_opencv_threads(
+        self, mock_tqdm, mock_pool, mock_get_threads, mock_set_threads, mock_pending
+    ):
+        """Test that OpenCV runs single-threaded inside the pool, then restores"""
+        mock_tqdm.return_value = [None, "a.jpg", None]
+
+        def check_threads(*args, **kwargs):
+            mock_set_threads.assert_called_once_with(1)
+            return MagicMock()
+
+        mock_pool.side_effect = check_threads
+
+        process_directory(self.temp_dir)
+
+        assert mock_set_threads.call_args_list[-1].args == (8,), "Should restore"
+        mock_pending.assert_called_once_with(["a.jpg"])
 
     def test_process_directory_empty_directory(self, capsys):
         """Test process_directory with empty directory"""
@@ -308,6 +894,192 @@ class TestProcessDirectory:
         assert "No images found" in captured.out
 
 
+class TestImageHeader:
+    """Test reading orientation and size from the image header"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.image_path = os.path.join(self.temp_dir, "test_image.jpg")
+
+    def teardown_method(self):
+        """Clean up test fixtures"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_read_image_header(self):
+        """Test that the orientation tag and size come from one header read"""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        TestImageCreation.create_test_image(width=1600, height=1200).save(
+            self.image_path, exif=exif
+        )
+
+        assert read_image_header(self.image_path) == (6, (1600, 1200))
+
+    def test_read_image_header_broken_file(self):
+        """Test that unreadable files don't trigger ultralytics' pi-heif install"""
+        with open(self.image_path, "wb") as f:
+            f.write(b"not an image")
+
+        with patch("ultralytics.utils.checks.check_requirements") as mock_check:
+            result = read_image_header(self.image_path)
+
+        assert result == (None, None), "Should report a missing header"
+        mock_check.assert_not_called()
+
+
+class TestGrayProxy:
+    """Test loading the grayscale detection proxy"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.jpeg_path = os.path.join(self.temp_dir, "test_image.jpg")
+        self.png_path = os.path.join(self.temp_dir, "test_image.png")
+        TestImageCreation.create_test_image(width=1600, height=1200).save(
+            self.jpeg_path
+        )
+        TestImageCreation.create_test_image(width=1600, height=1200).save(
+            self.png_path
+        )
+
+    def teardown_method(self):
+        """Clean up test fixtures"""
+        shutil.rmtree(self.temp_dir)
+
+    @staticmethod
+    def make_turbojpeg(width=1600, height=1200):
+        """Create a mock TurboJPEG decoder that honours the scaling factor"""
+        mock_tj = Mock()
+        mock_tj.scaling_factors = frozenset([(1, 8), (1, 4), (1, 2), (1, 1), (2, 1)])
+        mock_tj.decode_header.return_value = (width, height, 0, 0)
+
+        def decode(jpeg_buf, pixel_format, scaling_factor):
+            num, denom = scaling_factor or (1, 1)
+            return np.zeros(
+                (height * num // denom, width * num // denom, 1), dtype=np.uint8
+            )
+
+        mock_tj.decode.side_effect = decode
+        return mock_tj
+
+    def test_load_gray_proxy_with_opencv(self):
+        """Test the OpenCV path returns a downscaled grayscale image"""
+        with patch("rotate._TURBOJPEG", None):
+            gray = load_gray_proxy(self.jpeg_path, 640)
+
+        assert gray.shape == (480, 640), "Should downscale to the proxy size"
+
+    def test_load_gray_proxy_with_turbojpeg(self):
+        """Test JPEGs are decoded to grayscale at a reduced DCT scale"""
+        mock_tj = self.make_turbojpeg()
+
+        with patch("rotate._TURBOJPEG", mock_tj):
+            gray = load_gray_proxy(self.jpeg_path, 640)
+
+        _, kwargs = mock_tj.decode.call_args
+        assert kwargs["scaling_factor"] == (1, 2), "Should decode at half scale"
+        assert gray.shape == (480, 640), "Should downscale to the proxy size"
+
+    def test_load_gray_proxy_png_skips_turbojpeg(self):
+        """Test that non-JPEG files are decoded by OpenCV"""
+        mock_tj = self.make_turbojpeg()
+
+        with patch("rotate._TURBOJPEG", mock_tj):
+            gray = load_gray_proxy(self.png_path, 640)
+
+        mock_tj.decode.assert_not_called()
+        assert gray.shape == (480, 640), "Should still load the PNG"
+
+    def test_load_gray_proxy_opencv_reduced_decode(self):
+        """Test the OpenCV path decodes JPEGs at a reduced DCT scale"""
+        with patch("rotate._TURBOJPEG", None), patch(
+            "rotate.cv2.imread", wraps=cv2.imread
+        ) as mock_imread:
+            gray = load_gray_proxy(self.jpeg_path, 640)
+
+        mock_imread.assert_called_once_with(
+            self.jpeg_path, cv2.IMREAD_REDUCED_GRAYSCALE_2
+        )
+        assert gray.shape == (480, 640), "Should downscale to the proxy size"
+
+    def test_load_gray_proxy_opencv_small_jpeg(self):
+        """Test JPEGs too small to reduce are decoded at full scale"""
+        with patch("rotate._TURBOJPEG", None), patch(
+            "rotate.cv2.imread", wraps=cv2.imread
+        ) as mock_imread:
+            load_gray_proxy(self.jpeg_path, 1200)
+
+        mock_imread.assert_called_once_with(self.jpeg_path, cv2.IMREAD_GRAYSCALE)
+
+    def test_load_gray_proxy_turbojpeg_disabled(self):
+        """Test that callers can force the OpenCV path (e.g. for EXIF images)"""
+        mock_tj = self.make_turbojpeg()
+
+        with patch("rotate._TURBOJPEG", mock_tj):
+            load_gray_proxy(self.jpeg_path, 640, use_turbojpeg=False)
+
+        mock_tj.decode.assert_not_called()
+
+    def test_load_gray_proxy_turbojpeg_failure(self):
+        """Test fallback to OpenCV when libjpeg-turbo can't decode the file"""
+        mock_tj = self.make_turbojpeg()
+        mock_tj.decode.side_effect = OSError("Test exception")
+
+        with patch("rotate._TURBOJPEG", mock_tj):
+            gray = load_gray_proxy(self.jpeg_path, 640)
+
+        assert gray.shape == (480, 640), "Should fall back to cv2.imread"
+
+    def test_load_gray_proxy_invalid_path(self):
+        """Test loading a proxy from a missing file"""
+        assert load_gray_proxy("/nonexistent/path/image.png", 640) is None
+
+
+class TestRotation:
+    """Test image rotation helpers"""
+
+    @pytest.mark.parametrize(
+        "angle, rotate_code",
+        [
+            (90, cv2.ROTATE_90_CLOCKWISE),
+            (180, cv2.ROTATE_180),
+            (270, cv2.ROTATE_90_COUNTERCLOCKWISE),
+        ],
+    )
+    def test_rotated_view_matches_cv2_rotate(self, angle, rotate_code):
+        """Test that views match cv2.rotate without copying the buffer"""
+        img = np.random.randint(0, 255, (30, 40, 3), dtype=np.uint8)
+
+        view = rotated_view(img, angle)
+
+        assert np.array_equal(view, cv2.rotate(img, rotate_code))
+        assert np.shares_memory(view, img), "Should not copy the image"
+
+    def test_rotate_image_180_in_place(self):
+        """Test that an in-place 180° rotation reuses the image buffer"""
+        img = np.random.randint(0, 255, (30, 40, 3), dtype=np.uint8)
+        expected = cv2.rotate(img, cv2.ROTATE_180)
+
+        rotated = rotate_image(img, cv2.ROTATE_180, in_place=True)
+
+        assert np.array_equal(rotated, expected)
+        assert rotated is img, "Should flip within the original buffer"
+
+    @pytest.mark.parametrize(
+        "rotate_code", [cv2.ROTATE_90_CLOCKWISE, cv2.ROTATE_90_COUNTERCLOCKWISE]
+    )
+    def test_rotate_image_90_in_place_copies(self, rotate_code):
+        """Test that 90° rotations, which change shape, still allocate"""
+        img = np.random.randint(0, 255, (30, 40, 3), dtype=np.uint8)
+        original = img.copy()
+
+        rotated = rotate_image(img, rotate_code, in_place=True)
+
+        assert np.array_equal(rotated, cv2.rotate(original, rotate_code))
+        assert np.array_equal(img, original), "Should leave the source untouched"
+
+
 class TestProcessSingleImage:
     """Test single image processing"""
 
@@ -326,9 +1098,119 @@ class TestProcessSingleImage:
     @patch("rotate.auto_rotate")
     def test_process_single_image(self, mock_auto_rotate):
         """Test processing a single image"""
-        process_single_image(self.test_image_path)
+        mock_auto_rotate.return_value = True
+
+        result = process_single_image(self.test_image_path)
+
+        mock_auto_rotate.assert_called_once_with(
+            self.test_image_path, object_fallback=False
+        )
+        assert result is None, "Should not queue images that were handled"
+
+    @patch("rotate.auto_rotate")
+    def test_process_single_image_pending_objects(self, mock_auto_rotate):
+        """Test that images without faces are returned for object detection"""
+        mock_auto_rotate.return_value = False
+
+        result = process_single_image(self.test_image_path)
+
+        assert result == self.test_image_path, "Should queue image for YOLO"
+
+
+class TestRotateByObjects:
+    """Test the batched YOLO rotation step"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.image_path = os.path.join(self.temp_dir, "test_image.jpg")
+        TestImageCreation.create_test_image(width=1600, height=1200).save(
+            self.image_path
+        )
+
+    def teardown_method(self):
+        """Clean up test fixtures"""
+        shutil.rmtree(self.temp_dir)
+
+    @patch("rotate.detect_objects_yolo_batch")
+    def test_rotate_by_objects_uses_small_proxy(self, mock_detect_objects):
+        """Test that YOLO sees 320px proxies but the full image is saved"""
+        img = TestImageCreation.create_cv2_image(width=1600, height=1200)
+        mock_detect_objects.return_value = [False, True, False, False]  # 90°
+
+        saved = rotate_by_objects([(self.image_path, img)], Mock())
+
+        rotations = mock_detect_objects.call_args.args[0]
+        assert [r.shape[:2] for r in rotations] == [
+            (240, 320),
+            (320, 240),
+            (240, 320),
+            (320, 240),
+        ], "Should run YOLO on rotated 320px proxies"
+        assert saved == [True], "Should report the image as rotated"
+        with Image.open(self.image_path) as result:
+            assert result.size == (1200, 1600), "Should save the full-size rotation"
+
+    @patch("rotate.record_result")
+    @patch("rotate.cv2.imwrite", return_value=False)
+    @patch("rotate.detect_objects_yolo_batch")
+    def test_rotate_by_objects_save_failure(
+        self, mock_detect_objects, mock_imwrite, mock_record_result
+    ):
+        """Test that a failed write is reported and not cached"""
+        img = TestImageCreation.create_cv2_image()
+        mock_detect_objects.return_value = [False, True, False, False]  # 90°
+
+        saved = rotate_by_objects([(self.image_path, img)], Mock())
+
+        assert saved == [False], "Should report the failed save"
+        mock_record_result.assert_not_called()
+
+
+class TestProcessPendingImages:
+    """Test the batched object detection fallback"""
+
+    def setup_method(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.image_paths = []
+        for i in range(6):
+            img_path = os.path.join(self.temp_dir, f"test_image_{i}.jpg")
+            TestImageCreation.create_test_image().save(img_path)
+            self.image_paths.append(img_path)
+
+    def teardown_method(self):
+        """Clean up test fixtures"""
+        shutil.rmtree(self.temp_dir)
+
+    @patch("rotate.rotate_by_objects")
+    @patch("rotate.get_yolo_model")
+    def test_process_pending_images_batches_across_images(
+        self, mock_get_model, mock_rotate_by_objects
+    ):
+        """Test that several images share each YOLO batch"""
+        mock_model = Mock()
+        mock_get_model.return_value = mock_model
+
+        process_pending_images(self.image_paths)
+
+        # 16 rotations per batch -> 4 images per call
+        batch_sizes = [
+            len(call.args[0]) for call in mock_rotate_by_objects.call_args_list
+        ]
+        assert batch_sizes == [4, 2], "Should batch 4 images per YOLO call"
+
+    @patch("rotate.rotate_by_objects")
+    @patch("rotate.get_yolo_model")
+    def test_process_pending_images_without_model(
+        self, mock_get_model, mock_rotate_by_objects
+    ):
+        """Test that images are left as-is when YOLO cannot be loaded"""
+        mock_get_model.return_value = None
+
+        process_pending_images(self.image_paths)
 
-        mock_auto_rotate.assert_called_once_with(self.test_image_path)
+        mock_rotate_by_objects.assert_not_called()
 
 
 class TestIntegration: